@@ -1,11 +1,30 @@
 import os
-from datetime import datetime, timedelta
-from flask import Flask, request, render_template_string, jsonify
+import re
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from flask import Flask, Response, request, render_template_string
+from flask_compress import Compress
+import numpy as np
+import orjson
 import pandas as pd
-from werkzeug.utils import secure_filename
+import pyarrow as pa
+from pyarrow import csv as pa_csv
 
 app = Flask(__name__)
 app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024  # 25 MB
+app.config["COMPRESS_MIMETYPES"] = ["application/json", "text/html"]
+app.config["COMPRESS_LEVEL"] = 4
+Compress(app)
+
+# Results of recent uploads, keyed by file content + settings
+RESULT_CACHE = OrderedDict()
+RESULT_CACHE_SIZE = 32
+RESULT_CACHE_TTL = 3600  # seconds
+_cache_lock = threading.Lock()
 
 # Default timeline and annotations
 DEFAULT_TIMELINE = [
@@ -25,67 +44,193 @@ DEFAULT_ANNOTATIONS = {
     "12:51": "Workshop ends"
 }
 
-def process_file_simple(file_data, timeline, annotations):
+DAY_NS = 86_400_000_000_000  # nanoseconds per day
+
+# 24-hour HH:MM; use fullmatch() so it rejects what the settings modal's ^...$ rejects
+_HHMM = re.compile(r'([01]\d|2[0-3]):([0-5]\d)')
+
+# Join/Leave formats seen in Zoom exports, day-first before month-first
+DT_FORMATS = [
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %I:%M:%S %p",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S%z",
+]
+
+def guess_dt_format(series, preferred=None):
+    """Return the first known format that parses a sample cleanly, or None"""
+    sample = series.dropna().head(50)
+    if len(sample) == 0:
+        return None
+    candidates = [preferred] + DT_FORMATS if preferred else DT_FORMATS
+    for fmt in candidates:
+        if pd.to_datetime(sample, format=fmt, errors='coerce').notna().all():
+            return fmt
+    return None
+
+# Identity columns in order of preference, keyed by lower-cased header
+IDENTITY_COLUMNS = ['email', 'name', 'name (original name)', 'full name']
+
+# Canonical names of the columns the counter reads, keyed by lower-cased header
+CANON = {
+    'join time': 'Join Time',
+    'leave time': 'Leave Time',
+    'email': 'Email',
+    'name': 'Name',
+    'name (original name)': 'Name (Original Name)',
+    'full name': 'Full Name',
+}
+
+# Leading bytes of Excel workbooks: zip container (xlsx/xlsb) and OLE2 (legacy xls)
+EXCEL_SIGNATURES = (b'PK\x03\x04', b'\xd0\xcf\x11\xe0')
+
+def read_input_file(file_bytes):
+    """Read the uploaded report; CSVs load only the columns we use, Excel keeps cell types"""
+    buf = io.BytesIO(file_bytes)
+    if not file_bytes.startswith(EXCEL_SIGNATURES):
+        header = {c.strip().lower(): c for c in pd.read_csv(buf, nrows=0).columns}
+        buf.seek(0)
+        id_key = next((k for k in IDENTITY_COLUMNS if k in header), None)
+        usecols = [header[k] for k in ('join time', 'leave time', id_key) if k in header]
+        try:
+            # Declare the columns as strings up front so pyarrow never infers
+            # numbers or timestamps and re-renders them (leading zeros, offsets)
+            table = pa_csv.read_csv(buf, convert_options=pa_csv.ConvertOptions(
+                include_columns=usecols,
+                column_types={c: pa.string() for c in usecols},
+                strings_can_be_null=True
+            ))
+            return table.to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+        except Exception:
+            # pyarrow rejects some malformed rows the C engine tolerates
+            buf.seek(0)
+            return pd.read_csv(buf, usecols=usecols, dtype='string[pyarrow]')
+    try:
+        return pd.read_excel(buf, engine="calamine")
+    except Exception:
+        # python-calamine missing or unable to read this workbook
+        buf.seek(0)
+        return pd.read_excel(buf, engine="openpyxl")
+
+def get_cached_result(cache_key):
+    """Return a cached result that has not expired, or None"""
+    with _cache_lock:
+        entry = RESULT_CACHE.get(cache_key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > RESULT_CACHE_TTL:
+            del RESULT_CACHE[cache_key]
+            return None
+        RESULT_CACHE.move_to_end(cache_key)
+        return result
+
+def store_result(cache_key, result):
+    """Cache a result, evicting the least recently used entry when full"""
+    with _cache_lock:
+        RESULT_CACHE[cache_key] = (time.monotonic(), result)
+        RESULT_CACHE.move_to_end(cache_key)
+        while len(RESULT_CACHE) > RESULT_CACHE_SIZE:
+            RESULT_CACHE.popitem(last=False)
+
+@lru_cache(maxsize=32)
+def parse_timeline(timeline):
+    """Parse a tuple of HH:MM strings into read-only offsets from midnight"""
+    offsets = np.array(
+        [int(h) * 3600 + int(m) * 60 for h, m in (ts.split(':') for ts in timeline)],
+        dtype='timedelta64[s]'
+    ).astype('timedelta64[ns]')
+    offsets.setflags(write=False)
+    return offsets
+
+def process_file_simple(file_bytes, timeline, annotations):
     """Process file entirely in memory, return results immediately"""
     
+    offsets = parse_timeline(tuple(timeline))
+    
     # Read file into DataFrame
-    if file_data.filename.endswith('.csv'):
-        df = pd.read_csv(file_data, dtype=str)
-    else:
-        df = pd.read_excel(file_data, engine="openpyxl", dtype=str)
+    df = read_input_file(file_bytes)
     
-    # Normalize columns
-    df.columns = df.columns.str.strip().str.title()
+    # Normalize columns: look headers up case-insensitively, rename only the used ones
+    col_map = {}
+    for c in df.columns:
+        k = str(c).strip().lower()
+        if k in CANON:
+            col_map[k] = c
     
     # Check required columns
-    if 'Join Time' not in df.columns or 'Leave Time' not in df.columns:
+    if 'join time' not in col_map or 'leave time' not in col_map:
         return {"error": "Missing 'Join Time' or 'Leave Time' columns"}
     
-    # Parse datetimes
-    df['Join Time'] = pd.to_datetime(df['Join Time'], dayfirst=True, errors='coerce')
-    df['Leave Time'] = pd.to_datetime(df['Leave Time'], dayfirst=True, errors='coerce')
-    df = df.dropna(subset=['Join Time', 'Leave Time'])
+    # Keep only Join/Leave Time and the preferred identity column
+    id_key = next((k for k in IDENTITY_COLUMNS if k in col_map), None)
+    df = df[[col_map[k] for k in ('join time', 'leave time', id_key) if k in col_map]]
+    df = df.rename(columns={col_map[k]: CANON[k] for k in col_map})
+    
+    # Parse datetimes; both columns normally share one format, so try Join's first for Leave
+    fmt = None
+    for col in ['Join Time', 'Leave Time']:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+        fmt = guess_dt_format(df[col], fmt)
+        if fmt:
+            df[col] = pd.to_datetime(df[col], format=fmt, errors='coerce', cache=True)
+        else:
+            df[col] = pd.to_datetime(df[col], dayfirst=True, errors='coerce')
+        if isinstance(df[col].dtype, pd.DatetimeTZDtype):
+            # Timeline points are wall-clock times, so keep the local time and drop the offset
+            df[col] = df[col].dt.tz_localize(None)
+    df = df.loc[df['Join Time'].notna().to_numpy() & df['Leave Time'].notna().to_numpy()]
     
     if len(df) == 0:
         return {"error": "No valid date/time rows found"}
     
     # Create dedupe key
     if 'Email' in df.columns:
-        df['clean_email'] = df['Email'].astype(str).str.lower().str.strip()
+        df['clean_email'] = df['Email'].astype('string[pyarrow]').str.lower().str.strip().fillna('')
     else:
         for c in ['Name', 'Name (Original Name)', 'Full Name']:
             if c in df.columns:
-                df['clean_email'] = df[c].astype(str).str.lower().str.strip()
+                df['clean_email'] = df[c].astype('string[pyarrow]').str.lower().str.strip().fillna('')
                 break
         if 'clean_email' not in df.columns:
-            df['clean_email'] = df.index.astype(str)
-    
-    # Get event date
-    df['Event_Date'] = df['Join Time'].dt.date
-    report_date = df['Event_Date'].iloc[0]
-    
-    # Calculate counts for each timeline point
-    results = []
-    for time_str in timeline:
-        t_val = datetime.strptime(time_str, "%H:%M").time()
-        base_dt = datetime.combine(report_date, t_val)
-        
+            df['clean_email'] = df.index.astype('string[pyarrow]')
+    
+    # Get event date from the first row, plus its midnight as int64 ns
+    report_date = df['Join Time'].iloc[0].date()
+    day_start_ns = int(df['Join Time'].values[:1].astype('datetime64[ns]').view('i8')[0]) // DAY_NS * DAY_NS
+    
+    # Merge each attendee's overlapping sessions into disjoint intervals,
+    # grouping on a 64-bit hash of the dedupe key rather than the strings
+    df = df[df['Leave Time'] >= df['Join Time']]
+    df = df.assign(key=pd.util.hash_array(df['clean_email'].to_numpy()))
+    df = df.sort_values(['key', 'Join Time'])
+    keys = df['key'].to_numpy()
+    join_ns = df['Join Time'].to_numpy()
+    run_leave = df.groupby('key', sort=False)['Leave Time'].cummax().to_numpy()
+    new_segment = np.ones(len(df), dtype=bool)
+    new_segment[1:] = (keys[1:] != keys[:-1]) | (join_ns[1:] > run_leave[:-1])
+    segment = np.cumsum(new_segment)
+    intervals = df.groupby(segment, sort=False).agg(j=('Join Time', 'min'), l=('Leave Time', 'max'))
+    
+    # Sweep line over int64 ns: active = joined by t minus left before t
+    joins = np.sort(intervals['j'].values.astype('datetime64[ns]').view('i8'))
+    leaves = np.sort(intervals['l'].values.astype('datetime64[ns]').view('i8'))
+    check_arr = day_start_ns + offsets.view('i8')
+    if len(check_arr):
         # First timestamp special handling
-        if time_str == timeline[0]:
-            check_dt = pd.Timestamp(base_dt + timedelta(seconds=59))
-        else:
-            check_dt = pd.Timestamp(base_dt)
-        
-        active_rows = df[(df['Join Time'] <= check_dt) & (df['Leave Time'] >= check_dt)]
-        count = int(active_rows['clean_email'].nunique())
-        
-        # Add annotation if exists
-        if time_str in annotations:
-            display = f"{count} ({annotations[time_str]})"
-        else:
-            display = str(count)
-        
-        results.append([time_str, display])
+        check_arr[0] += 59_000_000_000
+    counts = np.searchsorted(joins, check_arr, side='right') - np.searchsorted(leaves, check_arr, side='left')
+    
+    # Add annotation if exists
+    results = [
+        [time_str, f"{count} ({annotations[time_str]})" if time_str in annotations else str(count)]
+        for time_str, count in zip(timeline, counts.tolist())
+    ]
     
     return {"success": True, "results": results, "date": str(report_date)}
 
@@ -595,24 +740,32 @@ uploadArea.addEventListener('drop', (e) => {
 </html>
 """
 
-@app.route("/")
-def index():
-    return render_template_string(
+def ojsonify(obj):
+    """jsonify() replacement that serializes with orjson"""
+    return Response(orjson.dumps(obj), mimetype='application/json')
+
+# The page only embeds the module-level defaults, so render it once at startup
+with app.app_context():
+    INDEX_HTML = render_template_string(
         HTML_TEMPLATE, 
         timeline=DEFAULT_TIMELINE,
         annotations=DEFAULT_ANNOTATIONS
-    )
+    ).encode('utf-8')
+
+@app.route("/")
+def index():
+    return Response(INDEX_HTML, mimetype='text/html')
 
 @app.route("/process", methods=["POST"])
 def process():
     """Process file immediately and return results (no background tasks)"""
     
     if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
+        return ojsonify({"error": "No file uploaded"}), 400
     
     file = request.files['file']
     if file.filename == '':
-        return jsonify({"error": "No file selected"}), 400
+        return ojsonify({"error": "No file selected"}), 400
     
     # Get custom timeline/annotations from request
     timeline_str = request.form.get('timeline')
@@ -623,18 +776,37 @@ def process():
     
     try:
         if timeline_str:
-            timeline = eval(timeline_str)  # In production, use json.loads
+            parsed = orjson.loads(timeline_str)
+            if isinstance(parsed, list):
+                timeline = [t for t in parsed if isinstance(t, str) and _HHMM.fullmatch(t)]
         if annotations_str:
-            annotations = eval(annotations_str)
-    except:
+            parsed = orjson.loads(annotations_str)
+            if isinstance(parsed, dict):
+                annotations = {
+                    t: label for t, label in parsed.items()
+                    if _HHMM.fullmatch(t) and isinstance(label, str)
+                }
+    except ValueError:
         pass
     
     # Process file directly (no saving to disk)
     try:
-        result = process_file_simple(file, timeline, annotations)
-        return jsonify(result)
+        file_bytes = file.read()
+        
+        # Identical re-uploads with the same settings reuse the last result
+        digest = hashlib.blake2b(file_bytes, digest_size=16)
+        digest.update(orjson.dumps([timeline, annotations], option=orjson.OPT_SORT_KEYS))
+        cache_key = digest.hexdigest()
+        cached = get_cached_result(cache_key)
+        if cached is not None:
+            return ojsonify(cached)
+        
+        result = process_file_simple(file_bytes, timeline, annotations)
+        if result.get("success"):
+            store_result(cache_key, result)
+        return ojsonify(result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
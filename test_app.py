@@ -0,0 +1,45 @@
+import io
+import json
+
+from app import app
+
+
+def post_csv(text, timeline):
+    client = app.test_client()
+    data = {
+        "file": (io.BytesIO(text.encode()), "report.csv"),
+        "timeline": json.dumps(timeline),
+    }
+    return client.post("/process", data=data, content_type="multipart/form-data").get_json()
+
+
+def test_numeric_identities_stay_distinct():
+    text = (
+        "Name,Join Time,Leave Time\n"
+        "5551234567,05/01/2024 09:00:00,05/01/2024 10:00:00\n"
+        "05551234567,05/01/2024 09:00:00,05/01/2024 10:00:00\n"
+        "12345678901234567890,05/01/2024 09:00:00,05/01/2024 10:00:00\n"
+        "12345678901234567891,05/01/2024 09:00:00,05/01/2024 10:00:00\n"
+    )
+    result = post_csv(text, ["09:30"])
+    assert result["results"] == [["09:30", "4"]]
+
+
+def test_offset_timestamps_keep_local_wall_time():
+    text = (
+        "Email,Join Time,Leave Time\n"
+        "a@x.com,2024-01-05 09:00:00+05:30,2024-01-05 10:00:00+05:30\n"
+    )
+    result = post_csv(text, ["09:30", "11:00"])
+    assert result["date"] == "2024-01-05"
+    assert result["results"] == [["09:30", "1"], ["11:00", "0"]]
+
+
+def test_iso_timestamps_are_not_read_day_first():
+    text = (
+        "Email,Join Time,Leave Time\n"
+        "a@x.com,2024-01-05 09:00:00,2024-01-05 10:00:00\n"
+    )
+    result = post_csv(text, ["09:30"])
+    assert result["date"] == "2024-01-05"
+    assert result["results"] == [["09:30", "1"]]